@@ -1,8 +1,10 @@
 #ifndef BLOCKCHAIN_H
 #define BLOCKCHAIN_H
 
+#include <memory>
 #include <vector>
 #include "core/Block.h"
+#include "core/ShardLog.h"
 
 class Blockchain {
 private:
@@ -10,19 +12,23 @@ private:
     int difficulty;
 
 public:
-    Blockchain(int id); // Modified constructor to include ID
+    Blockchain(int id, const PersistenceConfig& config = PersistenceConfig::from_env());
     void add_block(const SecurePacket& packet);
     bool is_chain_valid() const;
     size_t get_size() const;
     const std::vector<Block>& get_chain() const;
     
     // Persistence
-    void save_to_disk() const;
-    void load_from_disk();
+    void save_to_disk();   // Write a compacted snapshot and start a fresh log
+    void load_from_disk(); // Replay snapshot + log tail
+    void sync();           // Force pending log records to stable storage
     
 private:
     int shard_id;
+    std::unique_ptr<ShardLog> log;
     std::string get_filename() const;
+    std::string get_base_name() const;
+    void load_legacy_file();
 };
 
 #endif // BLOCKCHAIN_H
@@ -0,0 +1,88 @@
+#ifndef SHARD_LOG_H
+#define SHARD_LOG_H
+
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+#include "core/Block.h"
+
+// When appended records are forced to stable storage
+enum class FsyncPolicy {
+    Always, // fsync after every record
+    Batch,  // group commit: fsync every N records, and at least every interval
+            // from a background flusher, so a record is acknowledged at most one
+            // interval before it is durable
+    Never   // leave flushing to the OS
+};
+
+struct PersistenceConfig {
+    FsyncPolicy fsync_policy = FsyncPolicy::Batch;
+    size_t group_commit_records = 64;
+    int group_commit_interval_ms = 50;
+    size_t snapshot_interval = 10000; // log records between compacted snapshots
+
+    // Reads SHARD_FSYNC (always|batch|never), SHARD_FSYNC_BATCH,
+    // SHARD_FSYNC_INTERVAL_MS and SHARD_SNAPSHOT_INTERVAL
+    static PersistenceConfig from_env();
+};
+
+// Append-only persistence for one shard.
+// shard_N.snap holds a compacted copy of the chain, shard_N.log the blocks
+// appended since. Both use checksummed, length-prefixed records:
+//   [u32 payload_len][u32 crc32(payload)][payload]
+class ShardLog {
+public:
+    static constexpr char SNAPSHOT_MAGIC[9] = "SVSNAP01";
+    static constexpr char LOG_MAGIC[9] = "SVLOG001";
+
+    ShardLog(const std::string& base_name, const PersistenceConfig& config);
+    ~ShardLog();
+
+    ShardLog(const ShardLog&) = delete;
+    ShardLog& operator=(const ShardLog&) = delete;
+
+    // Replay the snapshot and then the log tail. A torn or corrupt tail is
+    // truncated so later appends follow the last good record.
+    std::vector<Block> recover();
+
+    // Throw std::runtime_error if the record cannot be written or, under the
+    // fsync policy, made durable; the caller must not acknowledge it
+    void append(uint64_t index, const Block& block);
+    void sync();
+
+    // Write the whole chain as a new snapshot and start an empty log
+    void write_snapshot(const std::vector<Block>& chain);
+
+    bool needs_snapshot();
+    std::string snapshot_path() const;
+    std::string log_path() const;
+
+private:
+    std::string base_name;
+    PersistenceConfig config;
+    std::FILE* log_file = nullptr;
+    size_t records_since_snapshot = 0;
+    size_t unsynced_records = 0;
+    std::chrono::steady_clock::time_point last_sync;
+    std::string sync_error; // set by a failed fsync; every later write throws it
+
+    // Guards the log file and counters against the Batch flusher thread
+    std::mutex mutex;
+    std::condition_variable flusher_cv;
+    std::thread flusher;
+    bool stopping = false;
+
+    // Callers of these hold `mutex`
+    void open_log_for_append();
+    void reset_log();
+    void sync_locked();
+
+    void flush_loop();
+};
+
+#endif // SHARD_LOG_H
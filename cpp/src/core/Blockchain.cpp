@@ -1,19 +1,26 @@
-#include "core/Blockchain.h"
-
 #include "core/Blockchain.h"
 #include <fstream>
 #include <iostream>
 
-Blockchain::Blockchain(int id) : difficulty(2), shard_id(id) {
-    // Try to load from disk first
+Blockchain::Blockchain(int id, const PersistenceConfig& config)
+    : difficulty(2), shard_id(id),
+      log(std::make_unique<ShardLog>(get_base_name(), config)) {
+    // Replay snapshot + log tail
     load_from_disk();
+
+    // Migrate a shard written in the old full-rewrite format
+    if (chain.empty()) {
+        load_legacy_file();
+        if (!chain.empty()) save_to_disk();
+    }
     
-    // If chain is empty (load failed or no file), create Genesis
+    // If chain is empty (no persisted data), create Genesis
     if (chain.empty()) {
         SecurePacket genesis_packet("GENESIS_BLOCK");
         Block genesis("0", genesis_packet);
         chain.push_back(genesis);
-        save_to_disk();
+        log->append(0, genesis);
+        log->sync();
     }
 }
 
@@ -21,70 +28,64 @@ void Blockchain::add_block(const SecurePacket& packet) {
     Block new_block(chain.back().block_hash, packet);
     new_block.mine_block(difficulty);
     chain.push_back(new_block);
-    save_to_disk(); // Auto-save on new block
+    log->append(chain.size() - 1, new_block); // O(1) append instead of rewriting the shard
+    if (log->needs_snapshot()) {
+        save_to_disk();
+    }
 }
 
 std::string Blockchain::get_filename() const {
     return "shard_" + std::to_string(shard_id) + ".dat";
 }
 
-void Blockchain::save_to_disk() const {
-    std::ofstream file(get_filename(), std::ios::binary);
-    if (!file.is_open()) return;
-    
-    size_t size = chain.size();
-    file.write(reinterpret_cast<const char*>(&size), sizeof(size));
-    
-    for (const auto& block : chain) {
-        // Serialize block (simplified for this demo)
-        // We only save the packet content for simplicity in this text-based format
-        // In a real system, we'd serialize the whole struct
-        std::string content = block.packet.get_content();
-        size_t len = content.size();
-        file.write(reinterpret_cast<const char*>(&len), sizeof(len));
-        file.write(content.c_str(), len);
-        
-        // Save hashes
-        size_t hash_len = block.block_hash.size();
-        file.write(reinterpret_cast<const char*>(&hash_len), sizeof(hash_len));
-        file.write(block.block_hash.c_str(), hash_len);
-        
-        hash_len = block.previous_hash.size();
-        file.write(reinterpret_cast<const char*>(&hash_len), sizeof(hash_len));
-        file.write(block.previous_hash.c_str(), hash_len);
-    }
+std::string Blockchain::get_base_name() const {
+    return "shard_" + std::to_string(shard_id);
+}
+
+void Blockchain::save_to_disk() {
+    log->write_snapshot(chain);
 }
 
 void Blockchain::load_from_disk() {
+    chain = log->recover();
+}
+
+void Blockchain::sync() {
+    log->sync();
+}
+
+// Reader for shard_N.dat files written before the segment log existed.
+// Stops at the last complete block, like _iter_legacy in shard_log.py, so a
+// file truncated by a crash mid-rewrite still migrates what it holds.
+void Blockchain::load_legacy_file() {
     std::ifstream file(get_filename(), std::ios::binary);
     if (!file.is_open()) return;
+
+    auto read_field = [&file](std::string& out) {
+        size_t len;
+        if (!file.read(reinterpret_cast<char*>(&len), sizeof(len))) return false;
+        if (len >= SecurePacket::PACKET_SIZE) return false; // Nothing valid is this long
+        out.assign(len, ' ');
+        return static_cast<bool>(file.read(&out[0], len));
+    };
     
     size_t size;
-    file.read(reinterpret_cast<char*>(&size), sizeof(size));
+    if (!file.read(reinterpret_cast<char*>(&size), sizeof(size))) return;
     
     chain.clear();
     for (size_t i = 0; i < size; ++i) {
-        // Read content
-        size_t len;
-        file.read(reinterpret_cast<char*>(&len), sizeof(len));
-        std::string content(len, ' ');
-        file.read(&content[0], len);
-        
-        // Read hashes
-        size_t hash_len;
-        file.read(reinterpret_cast<char*>(&hash_len), sizeof(hash_len));
-        std::string block_hash(hash_len, ' ');
-        file.read(&block_hash[0], hash_len);
-        
-        file.read(reinterpret_cast<char*>(&hash_len), sizeof(hash_len));
-        std::string prev_hash(hash_len, ' ');
-        file.read(&prev_hash[0], hash_len);
+        std::string content, block_hash, prev_hash;
+        if (!read_field(content) || !read_field(block_hash) || !read_field(prev_hash)) {
+            std::cerr << "WARNING: " << get_filename() << " is truncated after block "
+                      << chain.size() << std::endl;
+            return;
+        }
         
         // Reconstruct block
         SecurePacket packet(content);
         Block b(prev_hash, packet);
         b.block_hash = block_hash; // Restore original hash
-        // Timestamp and nonce are lost in this simplified serialization but that's ok for visual demo
+        // Timestamp and nonce were not stored in this format, so these blocks do not revalidate
         
         chain.push_back(b);
     }
@@ -0,0 +1,450 @@
+#include "core/ShardLog.h"
+
+#include <algorithm>
+#include <array>
+#include <cerrno>
+#include <cstdlib>
+#include <cstring>
+#include <filesystem>
+#include <fstream>
+#include <iostream>
+#include <stdexcept>
+
+#ifdef _WIN32
+#include <io.h>
+#else
+#include <fcntl.h>
+#include <unistd.h>
+#endif
+
+namespace {
+
+    constexpr size_t MAGIC_SIZE = 8;
+    constexpr uint32_t MAX_RECORD_SIZE = 1 << 20;
+
+    // CRC-32 (IEEE 802.3), matching zlib.crc32 on the Python side
+    uint32_t crc32(const std::string& data) {
+        static const std::array<uint32_t, 256> table = [] {
+            std::array<uint32_t, 256> t{};
+            for (uint32_t i = 0; i < 256; ++i) {
+                uint32_t c = i;
+                for (int k = 0; k < 8; ++k) {
+                    c = (c & 1) ? 0xEDB88320u ^ (c >> 1) : c >> 1;
+                }
+                t[i] = c;
+            }
+            return t;
+        }();
+
+        uint32_t crc = 0xFFFFFFFFu;
+        for (unsigned char byte : data) {
+            crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8);
+        }
+        return crc ^ 0xFFFFFFFFu;
+    }
+
+    // Fixed-width little-endian encoding so files are portable between hosts
+    void put_u32(std::string& out, uint32_t v) {
+        for (int i = 0; i < 4; ++i) out.push_back(static_cast<char>((v >> (8 * i)) & 0xFF));
+    }
+
+    void put_u64(std::string& out, uint64_t v) {
+        for (int i = 0; i < 8; ++i) out.push_back(static_cast<char>((v >> (8 * i)) & 0xFF));
+    }
+
+    void put_str(std::string& out, const std::string& s) {
+        put_u32(out, static_cast<uint32_t>(s.size()));
+        out += s;
+    }
+
+    uint64_t get_uint(const std::string& in, size_t& pos, int width) {
+        if (pos + width > in.size()) throw std::runtime_error("record truncated");
+        uint64_t v = 0;
+        for (int i = 0; i < width; ++i) {
+            v |= static_cast<uint64_t>(static_cast<unsigned char>(in[pos + i])) << (8 * i);
+        }
+        pos += width;
+        return v;
+    }
+
+    std::string get_str(const std::string& in, size_t& pos) {
+        size_t len = static_cast<size_t>(get_uint(in, pos, 4));
+        if (pos + len > in.size()) throw std::runtime_error("record truncated");
+        std::string s = in.substr(pos, len);
+        pos += len;
+        return s;
+    }
+
+    // Payload: index, timestamp, nonce, previous_hash, data_hash, block_hash, content
+    std::string encode_block(uint64_t index, const Block& block) {
+        std::string payload;
+        put_u64(payload, index);
+        put_u64(payload, static_cast<uint64_t>(static_cast<int64_t>(block.timestamp)));
+        put_u64(payload, block.nonce);
+        put_str(payload, block.previous_hash);
+        put_str(payload, block.data_hash);
+        put_str(payload, block.block_hash);
+        put_str(payload, block.packet.get_content());
+
+        std::string record;
+        put_u32(record, static_cast<uint32_t>(payload.size()));
+        put_u32(record, crc32(payload));
+        return record + payload;
+    }
+
+    Block decode_block(const std::string& payload, uint64_t& index) {
+        size_t pos = 0;
+        index = get_uint(payload, pos, 8);
+        int64_t timestamp = static_cast<int64_t>(get_uint(payload, pos, 8));
+        uint64_t nonce = get_uint(payload, pos, 8);
+        std::string previous_hash = get_str(payload, pos);
+        std::string data_hash = get_str(payload, pos);
+        std::string block_hash = get_str(payload, pos);
+        std::string content = get_str(payload, pos);
+
+        // Restore the stored fields; the packet padding is random, so data_hash
+        // must come from disk rather than being recomputed
+        Block block(previous_hash, SecurePacket(content));
+        block.timestamp = static_cast<time_t>(timestamp);
+        block.nonce = nonce;
+        block.data_hash = data_hash;
+        block.block_hash = block_hash;
+        return block;
+    }
+
+    enum class RecordStatus {
+        Ok,
+        End,     // clean end of file
+        Torn,    // record runs past end of file
+        Corrupt  // complete record with a bad length or checksum
+    };
+
+    // `record_size` is set to header + payload length once the header has been read
+    RecordStatus read_record(std::istream& in, std::string& payload, uint64_t& record_size) {
+        char header[8];
+        in.read(header, sizeof(header));
+        if (in.gcount() == 0) return RecordStatus::End;
+        if (in.gcount() < static_cast<std::streamsize>(sizeof(header))) return RecordStatus::Torn;
+
+        std::string h(header, sizeof(header));
+        size_t pos = 0;
+        uint32_t len = static_cast<uint32_t>(get_uint(h, pos, 4));
+        uint32_t checksum = static_cast<uint32_t>(get_uint(h, pos, 4));
+        record_size = sizeof(header) + static_cast<uint64_t>(len);
+        // Payloads are never empty; an all-zero header is preallocated space, not a record
+        if (len == 0 || len > MAX_RECORD_SIZE) return RecordStatus::Corrupt;
+
+        payload.resize(len);
+        in.read(&payload[0], len);
+        if (in.gcount() < static_cast<std::streamsize>(len)) return RecordStatus::Torn;
+        return crc32(payload) == checksum ? RecordStatus::Ok : RecordStatus::Corrupt;
+    }
+
+    // True if every byte from `offset` to end of file is zero
+    bool tail_is_zero(const std::string& path, uint64_t offset) {
+        std::ifstream in(path, std::ios::binary);
+        in.seekg(static_cast<std::streamoff>(offset));
+        char buffer[4096];
+        while (in.read(buffer, sizeof(buffer)) || in.gcount() > 0) {
+            for (std::streamsize i = 0; i < in.gcount(); ++i) {
+                if (buffer[i] != 0) return false;
+            }
+        }
+        return true;
+    }
+
+    std::runtime_error corrupt_shard(const std::string& path, const std::string& reason) {
+        return std::runtime_error(path + ": " + reason +
+                                  "; refusing to start, shard files left untouched");
+    }
+
+    // Flush stdio buffers and force the file to stable storage; false on failure
+    bool sync_file(std::FILE* file) {
+        if (std::fflush(file) != 0) return false;
+#ifdef _WIN32
+        return _commit(_fileno(file)) == 0;
+#else
+        return ::fsync(fileno(file)) == 0;
+#endif
+    }
+
+    std::runtime_error sync_failed(const std::string& path, int err = errno) {
+        return std::runtime_error("sync failed on " + path + ": " + std::strerror(err));
+    }
+
+    // Make a rename durable
+    void sync_parent_dir(const std::string& path) {
+#ifndef _WIN32
+        std::filesystem::path dir = std::filesystem::path(path).parent_path();
+        if (dir.empty()) dir = ".";
+        int fd = ::open(dir.c_str(), O_RDONLY);
+        if (fd >= 0) {
+            ::fsync(fd);
+            ::close(fd);
+        }
+#else
+        (void)path;
+#endif
+    }
+}
+
+PersistenceConfig PersistenceConfig::from_env() {
+    PersistenceConfig config;
+    if (const char* policy = std::getenv("SHARD_FSYNC")) {
+        std::string p(policy);
+        if (p == "always") config.fsync_policy = FsyncPolicy::Always;
+        else if (p == "never") config.fsync_policy = FsyncPolicy::Never;
+        else config.fsync_policy = FsyncPolicy::Batch;
+    }
+    if (const char* batch = std::getenv("SHARD_FSYNC_BATCH")) {
+        config.group_commit_records = std::max(1L, std::atol(batch));
+    }
+    if (const char* interval = std::getenv("SHARD_FSYNC_INTERVAL_MS")) {
+        config.group_commit_interval_ms = std::atoi(interval);
+    }
+    if (const char* snapshot = std::getenv("SHARD_SNAPSHOT_INTERVAL")) {
+        config.snapshot_interval = std::max(1L, std::atol(snapshot));
+    }
+    return config;
+}
+
+ShardLog::ShardLog(const std::string& base, const PersistenceConfig& cfg)
+    : base_name(base), config(cfg), last_sync(std::chrono::steady_clock::now()) {
+    if (config.fsync_policy == FsyncPolicy::Batch && config.group_commit_interval_ms > 0) {
+        flusher = std::thread(&ShardLog::flush_loop, this);
+    }
+}
+
+ShardLog::~ShardLog() {
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        stopping = true;
+    }
+    flusher_cv.notify_all();
+    if (flusher.joinable()) flusher.join();
+
+    if (log_file) {
+        if (config.fsync_policy != FsyncPolicy::Never && unsynced_records > 0 &&
+            sync_error.empty() && !sync_file(log_file)) {
+            std::cerr << "WARNING: " << sync_failed(log_path()).what() << std::endl;
+        }
+        std::fclose(log_file);
+    }
+}
+
+// Makes SHARD_FSYNC_INTERVAL_MS an upper bound even when no further appends arrive
+void ShardLog::flush_loop() {
+    std::unique_lock<std::mutex> lock(mutex);
+    auto interval = std::chrono::milliseconds(config.group_commit_interval_ms);
+    while (!stopping) {
+        flusher_cv.wait_for(lock, interval, [this] { return stopping; });
+        if (!stopping && unsynced_records > 0 && sync_error.empty()) {
+            // A failure is left in sync_error for the next append() to report
+            try {
+                sync_locked();
+            } catch (const std::runtime_error&) {
+            }
+        }
+    }
+}
+
+std::string ShardLog::snapshot_path() const {
+    return base_name + ".snap";
+}
+
+std::string ShardLog::log_path() const {
+    return base_name + ".log";
+}
+
+std::vector<Block> ShardLog::recover() {
+    std::lock_guard<std::mutex> lock(mutex);
+    std::vector<Block> chain;
+    std::string payload;
+    uint64_t index;
+    uint64_t record_size = 0;
+
+    // The snapshot is only ever replaced by an atomic rename, so any damage
+    // here is real corruption rather than an interrupted write
+    std::ifstream snap(snapshot_path(), std::ios::binary);
+    if (snap.is_open()) {
+        char magic[MAGIC_SIZE + 8];
+        if (!snap.read(magic, sizeof(magic)) || std::memcmp(magic, SNAPSHOT_MAGIC, MAGIC_SIZE) != 0) {
+            throw corrupt_shard(snapshot_path(), "invalid snapshot header");
+        }
+        std::string count_bytes(magic + MAGIC_SIZE, 8);
+        size_t pos = 0;
+        uint64_t count = get_uint(count_bytes, pos, 8);
+        while (chain.size() < count) {
+            if (read_record(snap, payload, record_size) != RecordStatus::Ok) {
+                throw corrupt_shard(snapshot_path(),
+                                    "damaged record at block " + std::to_string(chain.size()));
+            }
+            Block block = decode_block(payload, index);
+            if (index != chain.size()) {
+                throw corrupt_shard(snapshot_path(),
+                                    "out-of-order block " + std::to_string(index));
+            }
+            chain.push_back(block);
+        }
+    }
+
+    // Replay the tail. Records already covered by the snapshot are skipped;
+    // this happens if the process stopped between a snapshot and the log reset.
+    records_since_snapshot = 0;
+    std::error_code ec;
+    if (!std::filesystem::exists(log_path(), ec)) {
+        reset_log();
+        return chain;
+    }
+
+    uint64_t file_size = std::filesystem::file_size(log_path());
+    std::ifstream log(log_path(), std::ios::binary);
+    char magic[MAGIC_SIZE];
+    log.read(magic, MAGIC_SIZE);
+    size_t header_bytes = static_cast<size_t>(log.gcount());
+    if (header_bytes < MAGIC_SIZE) {
+        // Interrupted while creating the log; it cannot hold any records yet
+        if (std::memcmp(magic, LOG_MAGIC, header_bytes) != 0) {
+            throw corrupt_shard(log_path(), "invalid log header");
+        }
+        log.close();
+        reset_log();
+        return chain;
+    }
+    if (std::memcmp(magic, LOG_MAGIC, MAGIC_SIZE) != 0) {
+        throw corrupt_shard(log_path(), "invalid log header");
+    }
+
+    uint64_t good_end = MAGIC_SIZE;
+    RecordStatus status;
+    while ((status = read_record(log, payload, record_size)) == RecordStatus::Ok) {
+        Block block = decode_block(payload, index);
+        if (index > chain.size()) {
+            throw corrupt_shard(log_path(), "gap before block " + std::to_string(index) +
+                                " (expected " + std::to_string(chain.size()) + ")");
+        }
+        if (index == chain.size()) {
+            chain.push_back(block);
+            ++records_since_snapshot;
+        }
+        good_end += record_size;
+    }
+    log.close();
+
+    // Only an interrupted final write may be discarded: a record cut off by
+    // end of file, a damaged record that ends exactly at end of file, or
+    // zero-filled space the filesystem allocated but never wrote
+    if (status == RecordStatus::Corrupt &&
+        good_end + record_size != file_size && !tail_is_zero(log_path(), good_end)) {
+        throw corrupt_shard(log_path(), "damaged record at offset " + std::to_string(good_end) +
+                            " followed by more data");
+    }
+    if (status != RecordStatus::End) {
+        std::cerr << "WARNING: truncating torn tail of " << log_path()
+                  << " at offset " << good_end << std::endl;
+        std::filesystem::resize_file(log_path(), good_end);
+    }
+    open_log_for_append();
+    return chain;
+}
+
+void ShardLog::open_log_for_append() {
+    if (log_file) std::fclose(log_file);
+    log_file = std::fopen(log_path().c_str(), "ab");
+    if (!log_file) throw std::runtime_error("cannot open " + log_path());
+}
+
+void ShardLog::reset_log() {
+    if (log_file) std::fclose(log_file);
+    log_file = std::fopen(log_path().c_str(), "wb");
+    if (!log_file) throw std::runtime_error("cannot open " + log_path());
+    bool written = std::fwrite(LOG_MAGIC, 1, MAGIC_SIZE, log_file) == MAGIC_SIZE &&
+                   sync_file(log_file);
+    int err = errno;
+    std::fclose(log_file);
+    log_file = nullptr;
+    if (!written) throw sync_failed(log_path(), err);
+    sync_parent_dir(log_path());
+    records_since_snapshot = 0;
+    unsynced_records = 0;
+    open_log_for_append();
+}
+
+void ShardLog::append(uint64_t index, const Block& block) {
+    std::string record = encode_block(index, block);
+    std::lock_guard<std::mutex> lock(mutex);
+    if (!sync_error.empty()) throw std::runtime_error(sync_error);
+    if (std::fwrite(record.data(), 1, record.size(), log_file) != record.size()) {
+        throw std::runtime_error("write failed on " + log_path());
+    }
+    // Hand every record to the OS so a process crash loses nothing;
+    // the fsync policy only governs power-loss durability
+    if (std::fflush(log_file) != 0) {
+        throw std::runtime_error("write failed on " + log_path() + ": " + std::strerror(errno));
+    }
+    ++records_since_snapshot;
+    ++unsynced_records;
+
+    switch (config.fsync_policy) {
+        case FsyncPolicy::Always:
+            sync_locked();
+            break;
+        case FsyncPolicy::Batch: {
+            auto elapsed = std::chrono::steady_clock::now() - last_sync;
+            if (unsynced_records >= config.group_commit_records ||
+                elapsed >= std::chrono::milliseconds(config.group_commit_interval_ms)) {
+                sync_locked();
+            }
+            break;
+        }
+        case FsyncPolicy::Never:
+            break;
+    }
+}
+
+void ShardLog::sync() {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (!sync_error.empty()) throw std::runtime_error(sync_error);
+    sync_locked();
+}
+
+void ShardLog::sync_locked() {
+    if (log_file && unsynced_records > 0 && !sync_file(log_file)) {
+        // After a failed fsync the kernel may have dropped the dirty pages, so
+        // a later fsync succeeding proves nothing; refuse all further writes
+        sync_error = sync_failed(log_path()).what();
+        throw std::runtime_error(sync_error);
+    }
+    unsynced_records = 0;
+    last_sync = std::chrono::steady_clock::now();
+}
+
+bool ShardLog::needs_snapshot() {
+    std::lock_guard<std::mutex> lock(mutex);
+    return records_since_snapshot >= config.snapshot_interval;
+}
+
+void ShardLog::write_snapshot(const std::vector<Block>& chain) {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (!sync_error.empty()) throw std::runtime_error(sync_error);
+    std::string tmp_path = snapshot_path() + ".tmp";
+    std::FILE* file = std::fopen(tmp_path.c_str(), "wb");
+    if (!file) throw std::runtime_error("cannot open " + tmp_path);
+
+    std::string header(SNAPSHOT_MAGIC, MAGIC_SIZE);
+    put_u64(header, chain.size());
+    std::fwrite(header.data(), 1, header.size(), file);
+    for (size_t i = 0; i < chain.size(); ++i) {
+        std::string record = encode_block(i, chain[i]);
+        std::fwrite(record.data(), 1, record.size(), file);
+    }
+    bool failed = !sync_file(file) || std::ferror(file) != 0;
+    int err = errno;
+    std::fclose(file);
+    if (failed) throw sync_failed(tmp_path, err);
+
+    // The snapshot becomes visible atomically; only then is the log discarded
+    std::filesystem::rename(tmp_path, snapshot_path());
+    sync_parent_dir(snapshot_path());
+    reset_log();
+}
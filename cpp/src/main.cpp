@@ -32,7 +32,15 @@ void run_interactive_mode() {
             std::stringstream buffer;
             std::streambuf* old = std::cout.rdbuf(buffer.rdbuf());
             
-            controller.route_packet(id, packet);
+            try {
+                controller.route_packet(id, packet);
+            } catch (const std::exception& e) {
+                // The block may not be on disk; refuse the vote and stop rather
+                // than acknowledge anything else from a shard in an unknown state
+                std::cout.rdbuf(old);
+                std::cout << "ERROR Vote not recorded for ID " << id << ": " << e.what() << std::endl;
+                throw;
+            }
             
             std::cout.rdbuf(old); // Reset cout
             std::string output = buffer.str();
@@ -57,7 +65,14 @@ void run_interactive_mode() {
 int main(int argc, char* argv[]) {
     // If argument provided, run interactive mode
     if (argc > 1 && std::string(argv[1]) == "--interactive") {
-        run_interactive_mode();
+        try {
+            run_interactive_mode();
+        } catch (const std::exception& e) {
+            // Shard recovery refuses to start on corrupt data rather than drop
+            // blocks, and a failed write or fsync stops the engine
+            std::cerr << "ERROR " << e.what() << std::endl;
+            return 1;
+        }
         return 0;
     }
 
@@ -21,10 +21,11 @@ from dotenv import load_dotenv
 from auth import require_auth, require_admin, create_token, hash_password, verify_password
 from database import (
     create_voter, get_voter_by_email, get_voter_by_id,
-    has_voted, mark_as_voted, log_action,
+    has_voted, mark_as_voted, unmark_as_voted, log_action,
     get_voter_count, get_votes_count
 )
 from crypto_utils import encrypt_vote, decrypt_vote, sha256_hash
+from tally import start_tally_job, read_tally_status
 
 # Load environment variables
 load_dotenv()
@@ -200,15 +201,25 @@ def vote():
         log_action(voter_id, 'VOTE_DUPLICATE', 'Attempted to vote twice', request.remote_addr)
         return jsonify({'error': 'You have already voted'}), 403
     
-    # Encrypt the vote
-    encrypted_content = encrypt_vote(content)
-    
-    # Send to C++ backend with encrypted content
-    response = system.send_command(f"VOTE {voter_id} {encrypted_content}")
+    # Claim the vote in the database before recording the ballot, so two
+    # concurrent requests for the same voter cannot both get through
+    if not mark_as_voted(voter_id):
+        log_action(voter_id, 'VOTE_DUPLICATE', 'Attempted to vote twice', request.remote_addr)
+        return jsonify({'error': 'You have already voted'}), 403
     
-    # Mark as voted
+    try:
+        # Encrypt the vote
+        encrypted_content = encrypt_vote(content)
+
+        # Send to C++ backend with encrypted content
+        response = system.send_command(f"VOTE {voter_id} {encrypted_content}")
+    except Exception as e:
+        # No ballot was recorded, so release the claim before failing the request
+        unmark_as_voted(voter_id)
+        log_action(voter_id, 'VOTE_FAILED', f'Vote failed: {e}', request.remote_addr)
+        raise
+
     if "SUCCESS" in response or "ERROR" not in response:
-        mark_as_voted(voter_id)
         log_action(voter_id, 'VOTE_CAST', f'Vote cast successfully', request.remote_addr)
         
         return jsonify({
@@ -217,6 +228,9 @@ def vote():
             'encrypted': True
         })
     else:
+        # An engine-side duplicate means a ballot is already recorded; keep the claim
+        if "already voted" not in response:
+            unmark_as_voted(voter_id)
         log_action(voter_id, 'VOTE_FAILED', f'Vote failed: {response}', request.remote_addr)
         return jsonify({'error': 'Failed to record vote'}), 500
 
@@ -256,6 +270,21 @@ def tally():
     response = system.send_command("TALLY")
     return response
 
+@app.route('/admin/tally', methods=['POST'])
+@require_admin
+def start_admin_tally():
+    """Start a decrypt-and-tally job over all shard data (admin only)"""
+    if not start_tally_job():
+        return jsonify(read_tally_status()), 409
+    log_action(request.voter_id, 'TALLY_STARTED', 'Decrypted tally job started', request.remote_addr)
+    return jsonify(read_tally_status()), 202
+
+@app.route('/admin/tally', methods=['GET'])
+@require_admin
+def admin_tally():
+    """Get the state, progress or result of the decrypt-and-tally job (admin only)"""
+    return jsonify(read_tally_status())
+
 @app.route('/admin/stats', methods=['GET'])
 @require_admin
 def admin_stats():
@@ -4,6 +4,7 @@ Uses Python's cryptography library for production-grade security
 """
 import hashlib
 import os
+from functools import lru_cache
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -45,14 +46,23 @@ def derive_key(password: str, salt: bytes = None) -> tuple:
     key = kdf.derive(password.encode('utf-8'))
     return key, salt
 
+@lru_cache(maxsize=None)
+def get_vote_key() -> bytes:
+    """
+    Derive the default vote encryption key once per process
+    PBKDF2 is deliberately slow, so re-deriving it per ballot dominates bulk decryption
+    """
+    key, _ = derive_key(ENCRYPTION_KEY, b'fixed-salt-12345')  # Fixed salt for consistency
+    return key
+
 def encrypt_vote(plaintext: str, key: bytes = None) -> str:
     """
     Encrypt vote data using AES-256-GCM
     Returns base64-encoded ciphertext with nonce
     """
     if key is None:
-        # Use default key (derive from ENCRYPTION_KEY)
-        key, _ = derive_key(ENCRYPTION_KEY, b'fixed-salt-12345')  # Fixed salt for consistency
+        # Use default key (derived from ENCRYPTION_KEY)
+        key = get_vote_key()
     
     # Generate random nonce
     nonce = os.urandom(12)
@@ -74,7 +84,7 @@ def decrypt_vote(encrypted: str, key: bytes = None) -> str:
     """
     if key is None:
         # Use default key
-        key, _ = derive_key(ENCRYPTION_KEY, b'fixed-salt-12345')
+        key = get_vote_key()
     
     # Decode from base64
     combined = base64.b64decode(encrypted.encode('utf-8'))
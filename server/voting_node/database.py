@@ -4,10 +4,22 @@ Uses SQLite for simplicity (can be upgraded to PostgreSQL for production)
 """
 import sqlite3
 import os
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from typing import Optional, Dict
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'voters.db')
+DB_PATH = os.getenv('DB_PATH', os.path.join(os.path.dirname(__file__), 'voters.db'))
+
+# Voter record cache settings (entries, seconds)
+VOTER_CACHE_SIZE = int(os.getenv('VOTER_CACHE_SIZE', '10000'))
+VOTER_CACHE_TTL = float(os.getenv('VOTER_CACHE_TTL', '300'))
+
+VOTER_COLUMNS = (
+    'id', 'email', 'password_hash', 'full_name',
+    'has_voted', 'is_admin', 'created_at', 'voted_at'
+)
 
 @contextmanager
 def get_db():
@@ -49,6 +61,141 @@ def init_db():
         
         conn.commit()
 
+# ============================================================================
+# VOTER RECORD CACHE
+# ============================================================================
+
+class _VoterRecord:
+    """Compact in-memory copy of a voters row"""
+    __slots__ = VOTER_COLUMNS + ('expires_at',)
+
+    def __init__(self, row, expires_at: float):
+        for column in VOTER_COLUMNS:
+            setattr(self, column, row[column])
+        self.expires_at = expires_at
+
+    def to_dict(self) -> Dict:
+        return {column: getattr(self, column) for column in VOTER_COLUMNS}
+
+class VoterCache:
+    """
+    Bounded LRU cache of voter records keyed by ID, with an email -> ID index.
+    Entries expire after `ttl` seconds so changes made by other processes
+    sharing the database are picked up eventually.
+
+    Writes bump a per-ID write sequence. A read-miss passes the sequence it
+    started at to put(), which then refuses to overwrite a newer write-through
+    with the row it fetched before that write committed. Only the latest
+    `max_size` write sequences are kept; a read that began before one that was
+    dropped (or before a clear()) is returned uncached.
+    """
+
+    def __init__(self, max_size: int = VOTER_CACHE_SIZE, ttl: float = VOTER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._by_id = OrderedDict()
+        self._id_by_email = {}
+        self._write_seq = 0
+        self._last_write = OrderedDict()  # voter ID -> sequence of its latest write, LRU order
+        self._stale_before = 0  # reads that began earlier may miss an untracked write
+        self._lock = threading.Lock()
+
+    def begin_read(self) -> int:
+        """Return the write sequence to pass to put() after a database read"""
+        with self._lock:
+            return self._write_seq
+
+    def mark_written(self, voter_id: int) -> int:
+        """Record a committed write to a voter and drop its cached record"""
+        with self._lock:
+            self._write_seq += 1
+            if self.max_size > 0:
+                self._last_write[voter_id] = self._write_seq
+                self._last_write.move_to_end(voter_id)
+                while len(self._last_write) > self.max_size:
+                    _, forgotten = self._last_write.popitem(last=False)
+                    self._stale_before = max(self._stale_before, forgotten)
+            record = self._by_id.get(voter_id)
+            if record is not None:
+                self._remove(record)
+            return self._write_seq
+
+    def get_by_id(self, voter_id: int) -> Optional[_VoterRecord]:
+        with self._lock:
+            record = self._by_id.get(voter_id)
+            if record is None:
+                return None
+            if record.expires_at <= time.monotonic():
+                self._remove(record)
+                return None
+            self._by_id.move_to_end(voter_id)
+            return record
+
+    def get_by_email(self, email: str) -> Optional[_VoterRecord]:
+        with self._lock:
+            voter_id = self._id_by_email.get(email)
+        if voter_id is None:
+            return None
+        return self.get_by_id(voter_id)
+
+    def put(self, row, read_seq: int) -> _VoterRecord:
+        record = _VoterRecord(row, time.monotonic() + self.ttl)
+        if self.max_size <= 0:
+            return record
+        with self._lock:
+            # The row was read before a later write (or clear) committed
+            if read_seq < self._stale_before or self._last_write.get(record.id, 0) > read_seq:
+                return record
+            old = self._by_id.get(record.id)
+            if old is not None:
+                self._remove(old)
+            self._by_id[record.id] = record
+            self._id_by_email[record.email] = record.id
+            while len(self._by_id) > self.max_size:
+                _, evicted = self._by_id.popitem(last=False)
+                self._id_by_email.pop(evicted.email, None)
+        return record
+
+    def invalidate(self, voter_id: int = None, email: str = None):
+        with self._lock:
+            if voter_id is None and email is not None:
+                voter_id = self._id_by_email.get(email)
+        if voter_id is not None:
+            self.mark_written(voter_id)
+
+    def clear(self):
+        with self._lock:
+            self._write_seq += 1
+            self._stale_before = self._write_seq
+            self._by_id.clear()
+            self._id_by_email.clear()
+            self._last_write.clear()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _remove(self, record: _VoterRecord):
+        # Caller must hold the lock
+        self._by_id.pop(record.id, None)
+        if self._id_by_email.get(record.email) == record.id:
+            del self._id_by_email[record.email]
+
+_voter_cache = VoterCache()
+
+def invalidate_voter(voter_id: int = None, email: str = None):
+    """Drop a voter from the record cache so the next lookup hits the database"""
+    _voter_cache.invalidate(voter_id=voter_id, email=email)
+
+def clear_voter_cache():
+    """Drop every cached voter record"""
+    _voter_cache.clear()
+
+# ============================================================================
+# VOTER QUERIES
+# ============================================================================
+
+_SELECT_VOTER = 'SELECT ' + ', '.join(VOTER_COLUMNS) + ' FROM voters WHERE '
+
 def create_voter(email: str, password_hash: str, full_name: str = None, is_admin: bool = False) -> int:
     """Create a new voter account"""
     with get_db() as conn:
@@ -57,36 +204,74 @@ def create_voter(email: str, password_hash: str, full_name: str = None, is_admin
             (email, password_hash, full_name, is_admin)
         )
         conn.commit()
-        return cursor.lastrowid
+        voter_id = cursor.lastrowid
+        # Write through so the login/profile that follows registration is served from memory
+        write_seq = _voter_cache.mark_written(voter_id)
+        row = conn.execute(_SELECT_VOTER + 'id = ?', (voter_id,)).fetchone()
+        if row:
+            _voter_cache.put(row, write_seq)
+        return voter_id
+
+def _get_voter_record(voter_id: int) -> Optional[_VoterRecord]:
+    record = _voter_cache.get_by_id(voter_id)
+    if record is not None:
+        return record
+    read_seq = _voter_cache.begin_read()
+    with get_db() as conn:
+        row = conn.execute(_SELECT_VOTER + 'id = ?', (voter_id,)).fetchone()
+    return _voter_cache.put(row, read_seq) if row else None
 
 def get_voter_by_email(email: str) -> Optional[Dict]:
     """Get voter by email address"""
-    with get_db() as conn:
-        cursor = conn.execute('SELECT * FROM voters WHERE email = ?', (email,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    record = _voter_cache.get_by_email(email)
+    if record is None:
+        read_seq = _voter_cache.begin_read()
+        with get_db() as conn:
+            row = conn.execute(_SELECT_VOTER + 'email = ?', (email,)).fetchone()
+        if not row:
+            return None
+        record = _voter_cache.put(row, read_seq)
+    return record.to_dict()
 
 def get_voter_by_id(voter_id: int) -> Optional[Dict]:
     """Get voter by ID"""
-    with get_db() as conn:
-        cursor = conn.execute('SELECT * FROM voters WHERE id = ?', (voter_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    record = _get_voter_record(voter_id)
+    return record.to_dict() if record else None
 
-def mark_as_voted(voter_id: int) -> bool:
-    """Mark a voter as having voted"""
+def _set_voted(voter_id: int, sql: str) -> bool:
     with get_db() as conn:
-        conn.execute(
-            'UPDATE voters SET has_voted = TRUE, voted_at = CURRENT_TIMESTAMP WHERE id = ?',
-            (voter_id,)
-        )
+        cursor = conn.execute(sql, (voter_id,))
         conn.commit()
-        return True
+        # Write through with the stored voted_at so cached profiles match the database
+        write_seq = _voter_cache.mark_written(voter_id)
+        row = conn.execute(_SELECT_VOTER + 'id = ?', (voter_id,)).fetchone()
+    if row:
+        _voter_cache.put(row, write_seq)
+    return cursor.rowcount == 1
+
+def mark_as_voted(voter_id: int) -> bool:
+    """
+    Mark a voter as having voted
+    Returns False if the voter had already voted; the database, not the cache,
+    decides, so concurrent requests cannot both claim the same vote
+    """
+    return _set_voted(
+        voter_id,
+        'UPDATE voters SET has_voted = TRUE, voted_at = CURRENT_TIMESTAMP '
+        'WHERE id = ? AND has_voted = FALSE'
+    )
+
+def unmark_as_voted(voter_id: int) -> bool:
+    """Release a vote claimed with mark_as_voted whose ballot was not recorded"""
+    return _set_voted(
+        voter_id,
+        'UPDATE voters SET has_voted = FALSE, voted_at = NULL WHERE id = ? AND has_voted = TRUE'
+    )
 
 def has_voted(voter_id: int) -> bool:
     """Check if voter has already voted"""
-    voter = get_voter_by_id(voter_id)
-    return voter['has_voted'] if voter else False
+    record = _get_voter_record(voter_id)
+    return record.has_voted if record else False
 
 def log_action(voter_id: int, action: str, details: str = None, ip_address: str = None):
     """Log an action to the audit trail"""
@@ -0,0 +1,276 @@
+"""
+Reader for shard persistence files written by the C++ core
+Each shard is a compacted snapshot (shard_N.snap) plus an append-only log of
+blocks written since (shard_N.log). Records in both files are framed as
+[u32 payload_len][u32 crc32(payload)][payload], little-endian.
+Shards still in the pre-log shard_N.dat format are read as a fallback.
+
+Usage:
+    python shard_log.py [--shard-dir DIR] [--dump SHARD_ID]
+"""
+import argparse
+import json
+import os
+import re
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+SNAPSHOT_MAGIC = b'SVSNAP01'
+LOG_MAGIC = b'SVLOG001'
+GENESIS_CONTENTS = ('GENESIS_BLOCK', 'GENESIS')
+
+MAX_RECORD_SIZE = 1 << 20
+LEGACY_MAX_FIELD = 1023  # SecurePacket::PACKET_SIZE - 1
+
+_SHARD_FILE = re.compile(r'^shard_(\d+)\.(snap|log|dat)$')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_RECORD_HEADER = struct.Struct('<II')
+_BLOCK_HEADER = struct.Struct('<QqQ')  # index, timestamp, nonce
+
+class ShardCorruptError(ValueError):
+    """Shard data is damaged somewhere other than an interrupted final write"""
+
+class ShardBlock:
+    """One block as stored on disk"""
+    __slots__ = ('index', 'timestamp', 'nonce', 'previous_hash',
+                 'data_hash', 'block_hash', 'content')
+
+    def __init__(self, index: int, timestamp: Optional[int], nonce: Optional[int],
+                 previous_hash: str, data_hash: str, block_hash: str, content: str):
+        self.index = index
+        self.timestamp = timestamp
+        self.nonce = nonce
+        self.previous_hash = previous_hash
+        self.data_hash = data_hash
+        self.block_hash = block_hash
+        self.content = content
+
+    @property
+    def is_genesis(self) -> bool:
+        return self.content in GENESIS_CONTENTS
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+def list_shards(shard_dir: str) -> List[int]:
+    """Return the IDs of all shards with persisted data in `shard_dir`"""
+    ids = set()
+    for name in os.listdir(shard_dir):
+        match = _SHARD_FILE.match(name)
+        if match:
+            ids.add(int(match.group(1)))
+    return sorted(ids)
+
+# ============================================================================
+# RECORD DECODING
+# ============================================================================
+
+# _read_record statuses, matching RecordStatus in ShardLog.cpp
+_OK, _END, _TORN, _CORRUPT = 'ok', 'end', 'torn', 'corrupt'
+
+def _read_record(file: BinaryIO):
+    """Return (status, payload, record_size) for the next record"""
+    header = file.read(_RECORD_HEADER.size)
+    if not header:
+        return _END, None, 0
+    if len(header) < _RECORD_HEADER.size:
+        return _TORN, None, 0
+    length, checksum = _RECORD_HEADER.unpack(header)
+    record_size = _RECORD_HEADER.size + length
+    # Payloads are never empty; an all-zero header is preallocated space, not a record
+    if length == 0 or length > MAX_RECORD_SIZE:
+        return _CORRUPT, None, record_size
+    payload = file.read(length)
+    if len(payload) < length:
+        return _TORN, None, record_size
+    if zlib.crc32(payload) != checksum:
+        return _CORRUPT, None, record_size
+    return _OK, payload, record_size
+
+def _decode_block(payload: bytes) -> ShardBlock:
+    index, timestamp, nonce = _BLOCK_HEADER.unpack_from(payload, 0)
+    pos = _BLOCK_HEADER.size
+    fields = []
+    for _ in range(4):
+        (length,) = _U32.unpack_from(payload, pos)
+        pos += _U32.size
+        fields.append(payload[pos:pos + length].decode('utf-8', errors='replace'))
+        pos += length
+    previous_hash, data_hash, block_hash, content = fields
+    return ShardBlock(index, timestamp, nonce, previous_hash, data_hash, block_hash, content)
+
+def _iter_snapshot(path: str) -> Iterator[ShardBlock]:
+    # Snapshots are replaced by atomic rename, so any damage is corruption
+    with open(path, 'rb') as file:
+        header = file.read(len(SNAPSHOT_MAGIC) + _U64.size)
+        if len(header) < len(SNAPSHOT_MAGIC) + _U64.size or not header.startswith(SNAPSHOT_MAGIC):
+            raise ShardCorruptError(f'{path}: invalid snapshot header')
+        (count,) = _U64.unpack_from(header, len(SNAPSHOT_MAGIC))
+        for position in range(count):
+            status, payload, _ = _read_record(file)
+            if status != _OK:
+                raise ShardCorruptError(f'{path}: damaged record at block {position}')
+            yield _decode_block(payload)
+
+def _iter_log(path: str) -> Iterator[ShardBlock]:
+    """Yield log records, stopping quietly at a torn tail the engine would truncate"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        magic = file.read(len(LOG_MAGIC))
+        if magic != LOG_MAGIC:
+            # A log interrupted while being created holds no records yet
+            if len(magic) < len(LOG_MAGIC) and LOG_MAGIC.startswith(magic):
+                return
+            raise ShardCorruptError(f'{path}: invalid log header')
+        good_end = len(LOG_MAGIC)
+        while True:
+            status, payload, record_size = _read_record(file)
+            if status == _OK:
+                good_end += record_size
+                yield _decode_block(payload)
+                continue
+            if status == _CORRUPT and good_end + record_size != file_size:
+                file.seek(good_end)
+                if file.read().strip(b'\0'):
+                    raise ShardCorruptError(
+                        f'{path}: damaged record at offset {good_end} followed by more data')
+            return
+
+def _iter_legacy(path: str) -> Iterator[ShardBlock]:
+    # size_t count, then per block: content, block_hash, previous_hash (size_t-prefixed)
+    with open(path, 'rb') as file:
+        header = file.read(_U64.size)
+        if len(header) < _U64.size:
+            return
+        (count,) = _U64.unpack(header)
+        for index in range(count):
+            fields = []
+            for _ in range(3):
+                prefix = file.read(_U64.size)
+                if len(prefix) < _U64.size:
+                    return
+                (length,) = _U64.unpack(prefix)
+                if length > LEGACY_MAX_FIELD:
+                    return
+                data = file.read(length)
+                if len(data) < length:
+                    return
+                fields.append(data.decode('utf-8', errors='replace'))
+            content, block_hash, previous_hash = fields
+            yield ShardBlock(index, None, None, previous_hash, '', block_hash, content)
+
+# ============================================================================
+# SHARD READING
+# ============================================================================
+
+def _file_identity(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def _replay(snapshot_path: str, log_path: str) -> Iterator[ShardBlock]:
+    """Yield snapshot blocks, then the log blocks that follow them"""
+    next_index = 0
+    if os.path.exists(snapshot_path):
+        for block in _iter_snapshot(snapshot_path):
+            if block.index != next_index:
+                raise ShardCorruptError(f'{snapshot_path}: out-of-order block {block.index}')
+            next_index += 1
+            yield block
+
+    if os.path.exists(log_path):
+        for block in _iter_log(log_path):
+            if block.index < next_index:
+                continue
+            if block.index > next_index:
+                raise ShardCorruptError(
+                    f'{log_path}: gap before block {block.index} (expected {next_index})')
+            next_index += 1
+            yield block
+
+def read_shard(shard_dir: str, shard_id: int, start: int = 0) -> Iterator[ShardBlock]:
+    """
+    Yield the blocks of a shard in chain order, beginning at block `start`.
+    Replays the snapshot and then the log tail the same way the engine does at
+    startup: log records already covered by the snapshot are skipped and a torn
+    final write ends the shard. Anything the engine would refuse to start on
+    (damaged snapshot, gap, damage before the end of the log) raises
+    ShardCorruptError.
+    Safe against a running engine: if it compacts the shard mid-read (new
+    snapshot, log reset), reading resumes from the new snapshot.
+    """
+    base = os.path.join(shard_dir, f'shard_{shard_id}')
+    snapshot_path, log_path = base + '.snap', base + '.log'
+
+    if not os.path.exists(snapshot_path) and not os.path.exists(log_path):
+        if os.path.exists(base + '.dat'):
+            for block in _iter_legacy(base + '.dat'):
+                if block.index >= start:
+                    yield block
+        return
+
+    while True:
+        snapshot_id = _file_identity(snapshot_path)
+        try:
+            for block in _replay(snapshot_path, log_path):
+                if block.index >= start:
+                    start = block.index + 1
+                    yield block
+            return
+        except ShardCorruptError:
+            # The log was reset under us after a new snapshot replaced the one
+            # we read; the new snapshot covers the blocks we would have missed
+            if _file_identity(snapshot_path) == snapshot_id:
+                raise
+
+def inspect_shard(shard_dir: str, shard_id: int) -> Dict:
+    """Summarise a shard: block count, hash linkage, corruption and on-disk file sizes"""
+    blocks = 0
+    linked = True
+    last_hash = None
+    error = None
+    try:
+        for block in read_shard(shard_dir, shard_id):
+            if last_hash is not None and block.previous_hash != last_hash:
+                linked = False
+            last_hash = block.block_hash
+            blocks += 1
+    except ShardCorruptError as e:
+        error = str(e)
+
+    base = os.path.join(shard_dir, f'shard_{shard_id}')
+    return {
+        'id': shard_id,
+        'blocks': blocks,
+        'linked': linked,
+        'head': last_hash,
+        'error': error,
+        'files': {
+            os.path.basename(path): os.path.getsize(path)
+            for path in (base + '.snap', base + '.log', base + '.dat')
+            if os.path.exists(path)
+        }
+    }
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect shard persistence files')
+    parser.add_argument('--shard-dir', default=os.getenv('SHARD_DIR', os.getcwd()),
+                        help='Directory containing shard files')
+    parser.add_argument('--dump', type=int, default=None, metavar='SHARD_ID',
+                        help='Print every block of one shard as JSON lines')
+    args = parser.parse_args()
+
+    if args.dump is not None:
+        for block in read_shard(args.shard_dir, args.dump):
+            print(json.dumps(block.to_dict()))
+    else:
+        summary = [inspect_shard(args.shard_dir, shard_id) for shard_id in list_shards(args.shard_dir)]
+        print(json.dumps({'shards': summary}, indent=2))
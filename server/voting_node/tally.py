@@ -0,0 +1,408 @@
+"""
+Parallel decrypt-and-tally pipeline for encrypted shard data
+Streams blocks out of every shard (see shard_log.py), decrypts them in a process pool
+and merges the per-candidate counts. Progress is checkpointed so a re-run only
+decrypts blocks appended since the previous run.
+
+The voting node runs this module as a separate process (start_tally_job) and
+reads progress back from a status file, so no process pool is ever created
+inside a web request.
+
+Usage:
+    python tally.py [--shard-dir DIR] [--workers N] [--checkpoint FILE] [--status FILE]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+from cryptography.exceptions import InvalidTag
+
+from crypto_utils import decrypt_vote, get_vote_key
+from shard_log import list_shards, read_shard
+
+# The C++ core writes shard files into its working directory
+SHARD_DIR = os.getenv('SHARD_DIR', os.getcwd())
+TALLY_WORKERS = int(os.getenv('TALLY_WORKERS', str(os.cpu_count() or 1)))
+TALLY_CHECKPOINT = os.getenv('TALLY_CHECKPOINT', os.path.join(SHARD_DIR, 'tally_checkpoint.json'))
+TALLY_STATUS = os.getenv('TALLY_STATUS', os.path.join(SHARD_DIR, 'tally_status.json'))
+
+BATCH_SIZE = 2000           # Ciphertexts handed to a worker at a time
+CHECKPOINT_INTERVAL = 50    # Batches merged between checkpoint writes
+STATUS_INTERVAL = 1.0       # Seconds between status file updates
+LOCK_WAIT = 2.0             # Seconds a tally retries the lock; status probes hold it only briefly
+
+# Checkpoint format history:
+#   1 - unversioned, offsets keyed by shard file name ("shard_N.dat")
+#   2 - offsets keyed by shard name ("shard_N")
+#   3 - per shard: offset, hash of the block before it, and that shard's counts
+CHECKPOINT_VERSION = 3
+
+class TallyInProgressError(RuntimeError):
+    """Another tally holds the checkpoint lock"""
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+def _init_worker():
+    """Derive the vote key once per worker process instead of once per ballot"""
+    get_vote_key()
+
+def _tally_batch(ciphertexts: List[str]) -> Tuple[Counter, int]:
+    """Decrypt a batch of ballots and count them per candidate"""
+    key = get_vote_key()
+    counts = Counter()
+    invalid = 0
+    for ciphertext in ciphertexts:
+        try:
+            counts[decrypt_vote(ciphertext, key)] += 1
+        except (InvalidTag, ValueError):
+            invalid += 1
+    return counts, invalid
+
+def _iter_batches(shard_dir: str, shards: Dict[str, Dict]) -> Iterator[Tuple[str, int, str, List[str]]]:
+    """Yield (shard_name, next_offset, last_block_hash, ciphertexts) batches that never span shards"""
+    for shard_id in list_shards(shard_dir):
+        name = f'shard_{shard_id}'
+        batch = []
+        yielded_offset = next_offset = shards[name]['offset'] if name in shards else 0
+        last_hash = None
+        for block in read_shard(shard_dir, shard_id, next_offset):
+            next_offset = block.index + 1
+            last_hash = block.block_hash
+            if block.is_genesis:
+                continue
+            batch.append(block.content)
+            if len(batch) >= BATCH_SIZE:
+                yield name, next_offset, last_hash, batch
+                yielded_offset = next_offset
+                batch = []
+        if next_offset != yielded_offset:
+            yield name, next_offset, last_hash, batch
+
+# ============================================================================
+# CHECKPOINTS
+# ============================================================================
+
+def _empty_shard() -> Dict:
+    return {'offset': 0, 'hash': None, 'tally': Counter(), 'invalid': 0}
+
+def load_checkpoint(path: str) -> Dict:
+    """
+    Load a tally checkpoint, or an empty one if none exists.
+    Formats older than CHECKPOINT_VERSION have no per-shard counts to verify
+    against, so they are discarded and the tally restarts; a version this code
+    does not know raises ValueError.
+    """
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+        version = checkpoint.get('version', 1)
+        if version in (1, 2):
+            print(f"WARNING: {path} uses checkpoint format {version}; recounting all shards",
+                  file=sys.stderr)
+        elif version == CHECKPOINT_VERSION:
+            return {'shards': {
+                name: {
+                    'offset': int(entry['offset']),
+                    'hash': entry.get('hash'),
+                    'tally': Counter(entry.get('tally', {})),
+                    'invalid': int(entry.get('invalid', 0))
+                }
+                for name, entry in checkpoint.get('shards', {}).items()
+            }}
+        else:
+            raise ValueError(f'Unsupported tally checkpoint version {version} in {path}')
+    return {'shards': {}}
+
+def _verify_offsets(shard_dir: str, shards: Dict[str, Dict]) -> List[str]:
+    """
+    Drop checkpoint entries whose shard no longer has the checkpointed block
+    at its offset (rebuilt, shortened or removed), so those shards are recounted.
+    Returns the names of the dropped shards.
+    """
+    present = set(list_shards(shard_dir))
+    dropped = []
+    for name, entry in list(shards.items()):
+        shard_id = int(name.split('_', 1)[1])
+        if entry['offset'] == 0:
+            continue
+        block = None
+        if shard_id in present:
+            block = next(read_shard(shard_dir, shard_id, entry['offset'] - 1), None)
+        if block is None or block.index != entry['offset'] - 1 or block.block_hash != entry['hash']:
+            print(f"WARNING: {name} no longer matches the tally checkpoint; recounting it",
+                  file=sys.stderr)
+            del shards[name]
+            dropped.append(name)
+    return dropped
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Atomically write a tally checkpoint (caller must hold tally_lock)"""
+    _write_json(path, checkpoint)
+
+def _write_json(path: str, data: Dict):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, sort_keys=True)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+@contextmanager
+def tally_lock(path: str, wait: float = 0.0):
+    """
+    Hold an exclusive lock on `path`.lock for the duration, retrying for up to
+    `wait` seconds. The OS releases it if the holder dies, so a crashed tally
+    never wedges the next one.
+    Raises TallyInProgressError if another process still holds it.
+    """
+    lock_file = open(path + '.lock', 'a+')
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                if os.name == 'nt':
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TallyInProgressError(f'A tally is already running on {path}')
+                time.sleep(0.05)
+        yield
+    finally:
+        lock_file.close()
+
+def is_tally_running(checkpoint_path: str = TALLY_CHECKPOINT) -> bool:
+    """Check whether some process currently holds the tally lock"""
+    try:
+        with tally_lock(checkpoint_path):
+            return False
+    except TallyInProgressError:
+        return True
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_tally(shard_dir: str = SHARD_DIR, workers: int = TALLY_WORKERS,
+              checkpoint_path: Optional[str] = None,
+              progress: Optional[Callable[[int, float], None]] = None,
+              status_path: Optional[str] = None) -> Dict:
+    """
+    Decrypt and tally every ballot in `shard_dir`.
+    Resumes from `checkpoint_path` when given and updates it as batches complete.
+    `workers` <= 1 decrypts in the calling process.
+    `progress` is called with (blocks_processed, elapsed_seconds) after each batch.
+    `status_path` receives running / done / failed state for start_tally_job callers.
+    Raises TallyInProgressError if another tally is using the same checkpoint.
+    """
+    lock_path = checkpoint_path or status_path
+    if not lock_path:
+        return _run_pipeline(shard_dir, workers, None, progress)
+
+    with tally_lock(lock_path, wait=LOCK_WAIT):
+        if not status_path:
+            return _run_pipeline(shard_dir, workers, checkpoint_path, progress)
+
+        started_at = time.time()
+        last_status = [0.0]
+
+        def report(processed, elapsed):
+            if progress:
+                progress(processed, elapsed)
+            if elapsed - last_status[0] >= STATUS_INTERVAL:
+                last_status[0] = elapsed
+                _write_json(status_path, {
+                    'state': 'running',
+                    'started_at': started_at,
+                    'blocks_processed': processed,
+                    'blocks_per_second': round(processed / elapsed, 1) if elapsed > 0 else 0.0
+                })
+
+        _write_json(status_path, {'state': 'running', 'started_at': started_at, 'blocks_processed': 0})
+        try:
+            result = _run_pipeline(shard_dir, workers, checkpoint_path, report)
+        except Exception as e:
+            _write_json(status_path, {
+                'state': 'failed', 'started_at': started_at,
+                'finished_at': time.time(), 'error': str(e)
+            })
+            raise
+        _write_json(status_path, {
+            'state': 'done', 'started_at': started_at,
+            'finished_at': time.time(), 'result': result
+        })
+        return result
+
+def _run_pipeline(shard_dir: str, workers: int, checkpoint_path: Optional[str],
+                  progress: Optional[Callable[[int, float], None]]) -> Dict:
+    shards = load_checkpoint(checkpoint_path)['shards']
+    recounted = _verify_offsets(shard_dir, shards)
+    processed = 0
+    merged_batches = 0
+    started = time.monotonic()
+
+    def merge(name, next_offset, last_hash, result):
+        nonlocal processed, merged_batches
+        counts, batch_invalid = result
+        entry = shards.setdefault(name, _empty_shard())
+        entry['tally'].update(counts)
+        entry['invalid'] += batch_invalid
+        processed += next_offset - entry['offset']
+        entry['offset'] = next_offset
+        entry['hash'] = last_hash
+        merged_batches += 1
+        if checkpoint_path and merged_batches % CHECKPOINT_INTERVAL == 0:
+            save_checkpoint(checkpoint_path, _checkpoint_state(shards))
+        if progress:
+            progress(processed, time.monotonic() - started)
+
+    batches = _iter_batches(shard_dir, shards)
+
+    if workers <= 1:
+        _init_worker()
+        for name, next_offset, last_hash, ciphertexts in batches:
+            merge(name, next_offset, last_hash, _tally_batch(ciphertexts))
+    else:
+        # Merge in submission order so checkpointed offsets only ever cover finished batches
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending = deque()
+            for name, next_offset, last_hash, ciphertexts in batches:
+                pending.append((name, next_offset, last_hash, pool.submit(_tally_batch, ciphertexts)))
+                if len(pending) >= workers * 4:
+                    name, next_offset, last_hash, future = pending.popleft()
+                    merge(name, next_offset, last_hash, future.result())
+            while pending:
+                name, next_offset, last_hash, future = pending.popleft()
+                merge(name, next_offset, last_hash, future.result())
+
+    if checkpoint_path:
+        save_checkpoint(checkpoint_path, _checkpoint_state(shards))
+
+    tally = Counter()
+    for entry in shards.values():
+        tally.update(entry['tally'])
+    elapsed = time.monotonic() - started
+    return {
+        'tally': dict(sorted(tally.items())),
+        'total_votes': sum(tally.values()),
+        'invalid': sum(entry['invalid'] for entry in shards.values()),
+        'blocks_processed': processed,
+        'recounted_shards': recounted,
+        'elapsed_seconds': round(elapsed, 3),
+        'blocks_per_second': round(processed / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+def _checkpoint_state(shards: Dict[str, Dict]) -> Dict:
+    return {
+        'version': CHECKPOINT_VERSION,
+        'shards': {
+            name: {
+                'offset': entry['offset'],
+                'hash': entry['hash'],
+                'tally': dict(entry['tally']),
+                'invalid': entry['invalid']
+            }
+            for name, entry in shards.items()
+        }
+    }
+
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
+
+_job = None  # Most recent tally subprocess started by this process
+
+def start_tally_job(shard_dir: str = SHARD_DIR, workers: int = TALLY_WORKERS,
+                    checkpoint_path: str = TALLY_CHECKPOINT,
+                    status_path: str = TALLY_STATUS) -> bool:
+    """
+    Run the tally in a separate `python tally.py` process.
+    Returns False if a tally is already running.
+    """
+    global _job
+    if (_job is not None and _job.poll() is None) or is_tally_running(checkpoint_path):
+        return False
+    # Replace the previous run's status before returning, so a poller never
+    # mistakes the old result for this run's
+    started_at = time.time()
+    _write_json(status_path, {'state': 'starting', 'started_at': started_at})
+    try:
+        _job = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__),
+             '--shard-dir', shard_dir, '--workers', str(workers),
+             '--checkpoint', checkpoint_path, '--status', status_path],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    except OSError as e:
+        _write_json(status_path, {
+            'state': 'failed', 'started_at': started_at,
+            'finished_at': time.time(), 'error': str(e)
+        })
+        raise
+    return True
+
+def read_tally_status(checkpoint_path: str = TALLY_CHECKPOINT,
+                      status_path: str = TALLY_STATUS) -> Dict:
+    """Return the state of the latest tally job"""
+    # poll() also reaps a finished job
+    job_alive = _job is not None and _job.poll() is None
+    if not os.path.exists(status_path):
+        return {'state': 'idle'}
+    with open(status_path, 'r', encoding='utf-8') as file:
+        status = json.load(file)
+    state = status.get('state')
+    if job_alive or state not in ('starting', 'running'):
+        return status
+    if state == 'starting':
+        # Our job exited before taking the lock; one started elsewhere is left as is
+        if _job is not None:
+            status['state'] = 'interrupted'
+    elif not is_tally_running(checkpoint_path):
+        status['state'] = 'interrupted'
+    return status
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decrypt and tally encrypted shard data')
+    parser.add_argument('--shard-dir', default=SHARD_DIR, help='Directory containing shard files')
+    parser.add_argument('--workers', type=int, default=TALLY_WORKERS, help='Decryption processes')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file to resume from and update')
+    parser.add_argument('--status', default=None, help='File to write job state and progress to')
+    args = parser.parse_args()
+
+    last_report = [0.0]
+
+    def report(processed, elapsed):
+        if elapsed - last_report[0] >= 1.0:
+            last_report[0] = elapsed
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            print(f"  {processed} blocks processed ({rate:.0f} blocks/s)", file=sys.stderr)
+
+    try:
+        result = run_tally(args.shard_dir, args.workers, args.checkpoint, report, args.status)
+    except TallyInProgressError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Voting node modules import each other as top-level modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# database.py creates its schema on import; keep that out of the source tree
+os.environ.setdefault('DB_PATH', os.path.join(tempfile.mkdtemp(), 'voters.db'))
@@ -0,0 +1,146 @@
+"""
+Round-trip tests for shard_log.py against files written by the C++ core
+
+fixtures/shard_0.snap and fixtures/shard_0.log were produced by the engine
+(SecureVoteSystem --interactive) voting "vote-<id>" for voters routed to shard 0:
+  - shard_0.snap holds blocks 0-7
+  - shard_0.log holds blocks 0-6 (already covered by the snapshot, as after a
+    crash between writing the snapshot and resetting the log), then block 8,
+    then the first 20 bytes of block 8 again as a torn final write
+The engine itself recovers these files as one valid 9-block chain.
+"""
+import os
+import shutil
+import struct
+
+import pytest
+
+from shard_log import (LOG_MAGIC, SNAPSHOT_MAGIC, ShardCorruptError, inspect_shard,
+                       list_shards, read_shard)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+EXPECTED_CONTENTS = ['GENESIS_BLOCK'] + [
+    f'vote-{voter_id}' for voter_id in (2, 6, 10, 11, 12, 18, 20, 24)
+]
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    for name in ('shard_0.snap', 'shard_0.log'):
+        shutil.copy(os.path.join(FIXTURES, name), tmp_path / name)
+    return tmp_path
+
+def _log_records(data: bytes, pos: int = len(LOG_MAGIC)):
+    """Split a log into (offset, raw_record) pairs, ignoring a torn tail"""
+    records = []
+    while pos + 8 <= len(data):
+        (length,) = struct.unpack_from('<I', data, pos)
+        end = pos + 8 + length
+        if end > len(data):
+            break
+        records.append((pos, data[pos:end]))
+        pos = end
+    return records
+
+def test_reads_snapshot_then_log_tail(shard_dir):
+    blocks = list(read_shard(str(shard_dir), 0))
+
+    assert [block.index for block in blocks] == list(range(9))
+    assert [block.content for block in blocks] == EXPECTED_CONTENTS
+
+def test_block_fields_decode_in_engine_order(shard_dir):
+    blocks = list(read_shard(str(shard_dir), 0))
+
+    genesis = blocks[0]
+    assert genesis.is_genesis
+    assert genesis.previous_hash == '0'
+    assert genesis.nonce == 0
+    for previous, block in zip(blocks, blocks[1:]):
+        assert block.previous_hash == previous.block_hash
+        # Mined at difficulty 2, so a swapped field would not start with "00"
+        assert block.block_hash.startswith('00')
+        assert block.nonce > 0
+        assert block.timestamp >= previous.timestamp > 1_600_000_000
+        assert len(block.data_hash) == 16
+
+def test_start_offset_skips_earlier_blocks(shard_dir):
+    blocks = list(read_shard(str(shard_dir), 0, start=7))
+
+    assert [block.index for block in blocks] == [7, 8]
+    assert [block.content for block in blocks] == EXPECTED_CONTENTS[7:]
+
+def test_inspect_reports_linked_chain(shard_dir):
+    summary = inspect_shard(str(shard_dir), 0)
+
+    assert list_shards(str(shard_dir)) == [0]
+    assert summary['blocks'] == 9
+    assert summary['linked'] is True
+    assert summary['error'] is None
+
+def test_gap_in_log_raises(shard_dir):
+    log_path = shard_dir / 'shard_0.log'
+    data = log_path.read_bytes()
+    records = _log_records(data)
+    # Drop the snapshot and block 3 so the log alone has a gap
+    os.remove(shard_dir / 'shard_0.snap')
+    log_path.write_bytes(LOG_MAGIC + b''.join(raw for i, (_, raw) in enumerate(records) if i != 3))
+
+    with pytest.raises(ShardCorruptError, match='gap before block 4'):
+        list(read_shard(str(shard_dir), 0))
+
+def test_damage_before_end_of_log_raises(shard_dir):
+    log_path = shard_dir / 'shard_0.log'
+    data = bytearray(log_path.read_bytes())
+    offset, _ = _log_records(bytes(data))[0]
+    data[offset + 20] ^= 0xFF
+    log_path.write_bytes(bytes(data))
+
+    with pytest.raises(ShardCorruptError, match='followed by more data'):
+        list(read_shard(str(shard_dir), 0))
+
+def test_damaged_last_record_is_a_torn_tail(shard_dir):
+    log_path = shard_dir / 'shard_0.log'
+    data = log_path.read_bytes()
+    last_offset, last = _log_records(data)[-1]
+    # Remove the torn tail, then damage the final complete record
+    damaged = bytearray(data[:last_offset + len(last)])
+    damaged[-1] ^= 0xFF
+    log_path.write_bytes(bytes(damaged))
+
+    blocks = list(read_shard(str(shard_dir), 0))
+
+    assert [block.index for block in blocks] == list(range(8))
+
+def test_damaged_snapshot_raises(shard_dir):
+    snapshot_path = shard_dir / 'shard_0.snap'
+    data = bytearray(snapshot_path.read_bytes())
+    data[-5] ^= 0xFF
+    snapshot_path.write_bytes(bytes(data))
+
+    with pytest.raises(ShardCorruptError, match='damaged record at block 7'):
+        list(read_shard(str(shard_dir), 0))
+    assert 'damaged record' in inspect_shard(str(shard_dir), 0)['error']
+
+def test_compaction_during_read_resumes_from_new_snapshot(shard_dir):
+    snapshot_path = shard_dir / 'shard_0.snap'
+    log_path = shard_dir / 'shard_0.log'
+    snapshot = _log_records(snapshot_path.read_bytes(), len(SNAPSHOT_MAGIC) + 8)
+    block_8 = _log_records(log_path.read_bytes())[-1][1]
+
+    def write_snapshot(records):
+        tmp = shard_dir / 'shard_0.snap.tmp'
+        tmp.write_bytes(SNAPSHOT_MAGIC + struct.pack('<Q', len(records)) + b''.join(records))
+        os.replace(tmp, snapshot_path)
+
+    write_snapshot([raw for _, raw in snapshot[:4]])
+    log_path.write_bytes(LOG_MAGIC)
+    reader = read_shard(str(shard_dir), 0)
+    blocks = [next(reader) for _ in range(4)]
+
+    # The engine compacts blocks 0-7 into a new snapshot, resets the log and appends block 8
+    write_snapshot([raw for _, raw in snapshot])
+    log_path.write_bytes(LOG_MAGIC + block_8)
+    blocks.extend(reader)
+
+    assert [block.index for block in blocks] == list(range(9))
+    assert [block.content for block in blocks] == EXPECTED_CONTENTS
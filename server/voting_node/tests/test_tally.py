@@ -0,0 +1,131 @@
+"""
+Tests for the decrypt-and-tally pipeline in tally.py
+
+Each test starts from the engine-written shard fixtures (see test_shard_log.py),
+whose 8 non-genesis blocks hold plaintext "vote-<id>" contents and so count as
+invalid ballots, and appends encrypt_vote() ballots to the shard log.
+"""
+import json
+import os
+import shutil
+import struct
+import zlib
+
+import pytest
+
+import tally
+from crypto_utils import encrypt_vote
+from shard_log import LOG_MAGIC, ShardBlock, read_shard
+from tally import TallyInProgressError, run_tally, tally_lock
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+FIXTURE_INVALID = 8
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    for name in ('shard_0.snap', 'shard_0.log'):
+        shutil.copy(os.path.join(FIXTURES, name), tmp_path / name)
+    return str(tmp_path)
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return str(tmp_path / 'tally_checkpoint.json')
+
+def _encode(block: ShardBlock) -> bytes:
+    payload = struct.pack('<QqQ', block.index, block.timestamp, block.nonce)
+    for field in (block.previous_hash, block.data_hash, block.block_hash, block.content):
+        data = field.encode('utf-8')
+        payload += struct.pack('<I', len(data)) + data
+    return struct.pack('<II', len(payload), zlib.crc32(payload)) + payload
+
+def _append_ballots(shard_dir: str, candidates, hash_prefix: str = '00ballot') -> None:
+    """Rewrite shard_0.log as the whole chain so far plus one encrypted ballot per candidate"""
+    blocks = list(read_shard(shard_dir, 0))
+    for candidate in candidates:
+        previous = blocks[-1]
+        index = previous.index + 1
+        blocks.append(ShardBlock(index, previous.timestamp + 1, index, previous.block_hash,
+                                 f'data{index}', f'{hash_prefix}{index}', encrypt_vote(candidate)))
+    # Records already covered by the snapshot are skipped on replay
+    with open(os.path.join(shard_dir, 'shard_0.log'), 'wb') as file:
+        file.write(LOG_MAGIC + b''.join(_encode(block) for block in blocks))
+
+def test_counts_ballots_and_invalid_ciphertexts(shard_dir):
+    _append_ballots(shard_dir, ['Candidate A', 'Candidate B', 'Candidate A'])
+
+    result = run_tally(shard_dir, workers=1)
+
+    assert result['tally'] == {'Candidate A': 2, 'Candidate B': 1}
+    assert result['total_votes'] == 3
+    assert result['invalid'] == FIXTURE_INVALID
+    assert result['blocks_processed'] == 12
+    assert result['recounted_shards'] == []
+
+def test_process_pool_matches_single_process(shard_dir):
+    _append_ballots(shard_dir, ['Candidate A', 'Candidate B'] * 5)
+
+    pooled = run_tally(shard_dir, workers=2)
+    single = run_tally(shard_dir, workers=1)
+
+    assert pooled['tally'] == single['tally'] == {'Candidate A': 5, 'Candidate B': 5}
+    assert pooled['invalid'] == single['invalid'] == FIXTURE_INVALID
+
+def test_resume_only_decrypts_new_blocks(shard_dir, checkpoint):
+    _append_ballots(shard_dir, ['Candidate A', 'Candidate B'])
+    first = run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+    _append_ballots(shard_dir, ['Candidate B', 'Candidate C'])
+    second = run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+    assert first['blocks_processed'] == 11
+    assert second['blocks_processed'] == 2
+    assert second['tally'] == {'Candidate A': 1, 'Candidate B': 2, 'Candidate C': 1}
+    assert second['invalid'] == FIXTURE_INVALID
+    assert second['recounted_shards'] == []
+
+def test_rebuilt_shard_is_recounted(shard_dir, checkpoint):
+    _append_ballots(shard_dir, ['Candidate A', 'Candidate A'])
+    run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+    # Same length as before, but the checkpointed block now has a different hash
+    shutil.copy(os.path.join(FIXTURES, 'shard_0.log'), os.path.join(shard_dir, 'shard_0.log'))
+    _append_ballots(shard_dir, ['Candidate B', 'Candidate B'], hash_prefix='00rebuilt')
+    result = run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+    assert result['recounted_shards'] == ['shard_0']
+    assert result['tally'] == {'Candidate B': 2}
+    assert result['invalid'] == FIXTURE_INVALID
+
+def test_old_checkpoint_format_recounts_everything(shard_dir, checkpoint):
+    _append_ballots(shard_dir, ['Candidate A'])
+    with open(checkpoint, 'w', encoding='utf-8') as file:
+        json.dump({'shard_0.dat': 11}, file)
+
+    result = run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+    assert result['tally'] == {'Candidate A': 1}
+    assert result['blocks_processed'] == 10
+
+def test_unknown_checkpoint_version_raises(shard_dir, checkpoint):
+    with open(checkpoint, 'w', encoding='utf-8') as file:
+        json.dump({'version': tally.CHECKPOINT_VERSION + 1, 'shards': {}}, file)
+
+    with pytest.raises(ValueError, match='Unsupported tally checkpoint version'):
+        run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+def test_concurrent_tally_is_refused(shard_dir, checkpoint, monkeypatch):
+    monkeypatch.setattr(tally, 'LOCK_WAIT', 0.1)
+
+    with tally_lock(checkpoint):
+        with pytest.raises(TallyInProgressError):
+            run_tally(shard_dir, workers=1, checkpoint_path=checkpoint)
+
+def test_status_file_reports_result(shard_dir, checkpoint, tmp_path):
+    _append_ballots(shard_dir, ['Candidate A'])
+    status_path = str(tmp_path / 'tally_status.json')
+
+    result = run_tally(shard_dir, workers=1, checkpoint_path=checkpoint, status_path=status_path)
+    status = tally.read_tally_status(checkpoint, status_path)
+
+    assert status['state'] == 'done'
+    assert status['result'] == result
@@ -0,0 +1,118 @@
+"""
+Tests for the write-through voter record cache in database.py
+Each test gets its own SQLite file and a fresh VoterCache.
+"""
+import pytest
+
+import database
+from database import (VoterCache, clear_voter_cache, create_voter, get_voter_by_email,
+                      get_voter_by_id, has_voted, invalidate_voter, mark_as_voted,
+                      unmark_as_voted)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'voters.db'))
+    database.init_db()
+
+def _use_cache(monkeypatch, **kwargs) -> VoterCache:
+    cache = VoterCache(**kwargs)
+    monkeypatch.setattr(database, '_voter_cache', cache)
+    return cache
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    return _use_cache(monkeypatch, max_size=100, ttl=300)
+
+def _write_behind_cache(sql: str, params: tuple):
+    """Change the database the way another process would, without touching the cache"""
+    with database.get_db() as conn:
+        conn.execute(sql, params)
+        conn.commit()
+
+def _read_row(voter_id: int):
+    with database.get_db() as conn:
+        return conn.execute(database._SELECT_VOTER + 'id = ?', (voter_id,)).fetchone()
+
+def test_create_voter_writes_through(cache):
+    voter_id = create_voter('alice@example.com', 'hash', 'Alice')
+    _write_behind_cache('UPDATE voters SET full_name = ? WHERE id = ?', ('Changed', voter_id))
+
+    assert get_voter_by_id(voter_id)['full_name'] == 'Alice'
+    assert get_voter_by_email('alice@example.com')['id'] == voter_id
+
+def test_mark_as_voted_writes_through_and_claims_once(cache):
+    voter_id = create_voter('alice@example.com', 'hash')
+    assert not has_voted(voter_id)
+
+    assert mark_as_voted(voter_id) is True
+    assert cache.get_by_id(voter_id).has_voted
+    assert get_voter_by_id(voter_id)['voted_at'] is not None
+    assert mark_as_voted(voter_id) is False
+
+    assert unmark_as_voted(voter_id) is True
+    assert not has_voted(voter_id)
+    assert get_voter_by_id(voter_id)['voted_at'] is None
+
+def test_stale_read_miss_does_not_overwrite_newer_write(cache):
+    voter_id = create_voter('alice@example.com', 'hash')
+    invalidate_voter(voter_id)
+
+    # A lookup misses and reads the row, then a vote commits before it caches it
+    read_seq = cache.begin_read()
+    stale_row = _read_row(voter_id)
+    assert mark_as_voted(voter_id)
+    cache.put(stale_row, read_seq)
+
+    assert cache.get_by_id(voter_id).has_voted
+    assert has_voted(voter_id)
+
+def test_read_straddling_clear_is_not_cached(cache):
+    voter_id = create_voter('alice@example.com', 'hash')
+
+    read_seq = cache.begin_read()
+    row = _read_row(voter_id)
+    clear_voter_cache()
+    cache.put(row, read_seq)
+
+    assert cache.get_by_id(voter_id) is None
+
+def test_entries_expire_after_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, 'monotonic', lambda: now[0])
+    voter_id = create_voter('alice@example.com', 'hash', 'Alice')
+    _write_behind_cache('UPDATE voters SET full_name = ? WHERE id = ?', ('Changed', voter_id))
+
+    now[0] += cache.ttl - 1
+    assert get_voter_by_id(voter_id)['full_name'] == 'Alice'
+
+    now[0] += 2
+    assert get_voter_by_id(voter_id)['full_name'] == 'Changed'
+
+def test_invalidate_by_email(cache):
+    voter_id = create_voter('alice@example.com', 'hash', 'Alice')
+    _write_behind_cache('UPDATE voters SET full_name = ? WHERE id = ?', ('Changed', voter_id))
+
+    invalidate_voter(email='alice@example.com')
+
+    assert cache.get_by_email('alice@example.com') is None
+    assert get_voter_by_email('alice@example.com')['full_name'] == 'Changed'
+
+def test_cache_and_write_sequences_stay_bounded(db, monkeypatch):
+    cache = _use_cache(monkeypatch, max_size=3, ttl=300)
+    voter_ids = [create_voter(f'voter{i}@example.com', 'hash') for i in range(10)]
+    for voter_id in voter_ids:
+        mark_as_voted(voter_id)
+
+    assert len(cache) == 3
+    assert len(cache._last_write) == 3
+    assert cache.get_by_id(voter_ids[0]) is None
+    assert cache.get_by_id(voter_ids[-1]).has_voted
+
+def test_disabled_cache_keeps_nothing(db, monkeypatch):
+    cache = _use_cache(monkeypatch, max_size=0, ttl=300)
+    voter_id = create_voter('alice@example.com', 'hash')
+
+    assert mark_as_voted(voter_id)
+    assert has_voted(voter_id)
+    assert len(cache) == 0
+    assert not cache._last_write